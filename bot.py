@@ -5,12 +5,18 @@
 - ボタン：通知ON/OFFの切替（状態に応じて“次の操作”を表示）/ 今すぐ取得（同メッセージを編集で更新）
 - 通知ONにした瞬間は即取得して反映
 - 通知OFFにした瞬間は取得せず、最後に取得できた内容のみ表示
-- 定期ポーリング（2分おき）で空席状況に変化があれば“新規メッセージ”で通知
+- 定期ポーリング（2分おき。変化が無い間は最長10分まで間隔を延ばす）で空席状況に変化があれば“新規メッセージ”で通知
+  （通知ONのユーザが居ないとき・OPEN_HOURS の時間帯外は取得しない）
 - トークンは環境変数 BOT_TOKEN（TELEGRAM_BOT_TOKEN も可）からのみ取得
+- 空席ページはまず httpx で静的HTMLを取得し、読めなければ Playwright で描画して取得
+  （環境変数 USE_PLAYWRIGHT=0 で Playwright フォールバックを無効化）
+  （CDP_URL を指定すると、別に起動した Chromium に接続して使う）
 - tzdataが無い環境でもJST固定オフセットで動作可能
 必要パッケージ（参考）:
-  pip install "python-telegram-bot[job-queue]"==20.7 playwright==1.47.0
+  pip install "python-telegram-bot[job-queue,rate-limiter]"==20.7 httpx~=0.25.2 playwright==1.47.0
   python -m playwright install chromium
+  pip install uvloop  # 任意（あればイベントループに使う）
+  pip install orjson~=3.9  # 任意（あれば JSON の読み書きに使う）
 """
 
 from __future__ import annotations
@@ -18,13 +24,19 @@ import os
 import sys
 import json
 import re
+import html
+import hashlib
+import time
+import random
 import asyncio
-import traceback
+import threading
 import logging
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional, Tuple, Dict, Set
+from typing import AbstractSet, FrozenSet, Optional, Tuple, Dict, Set
 from datetime import datetime, timezone, timedelta
 
+import httpx
 from telegram import (
     Update,
     InlineKeyboardMarkup,
@@ -33,12 +45,16 @@ from telegram import (
 from telegram.ext import (
     ApplicationBuilder,
     Application,
+    AIORateLimiter,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
+    TypeHandler,
+    ApplicationHandlerStop,
     ContextTypes,
     filters,
 )
+from telegram.error import BadRequest, Forbidden, RetryAfter
 
 # ===== タイムゾーン（tzdata が無い環境でも動くフォールバック） =====
 try:
@@ -47,14 +63,49 @@ try:
 except Exception:
     TZ = timezone(timedelta(hours=9), name="JST")
 
+# 秒単位の表示なので、同じ秒の間は前回組み立てた文字列を返す
+_NOW_CACHE: Tuple[int, str] = (0, "")
+
 def now_jp() -> str:
-    return datetime.now(TZ).strftime("%Y-%m-%d %H:%M:%S")
+    # "YYYY-MM-DD HH:MM:SS"（isoformat は C 実装で strftime より速い。末尾の +09:00 は落とす）
+    global _NOW_CACHE
+    sec = int(time.time())
+    if _NOW_CACHE[0] != sec:
+        _NOW_CACHE = (sec, datetime.fromtimestamp(sec, TZ).isoformat(sep=" ", timespec="seconds")[:19])
+    return _NOW_CACHE[1]
 
 # ===== 設定 =====
 URL  = "https://www.kaikatsu.jp/shop/detail/vacancy.html?store_code=20328"  # 王子店 空席ページ
-CHECK_INTERVAL_SEC = 120
-SUBS_FILE  = "subs.json"   # 通知ONユーザ保存
-STATE_FILE = "state.json"  # 直近の取得結果保存（last_status, last_checked_at）
+CHECK_INTERVAL_SEC = 120       # 基本のポーリング間隔
+POLL_MAX_INTERVAL_SEC = 600    # 変化が無い間に延ばす間隔の上限
+POLL_FAIL_MAX_SEC = 3600       # 取得失敗が続くときの間隔の上限
+CACHE_TTL_SEC = 30  # この秒数以内の取得結果は使い回す
+# 取得のタイムアウト（段階ごと）。詰まったら早めに諦めてリトライ/次回に回す
+# 2回試行しても最悪 2×(15+25)+1.2 ≈ 81秒で、ポーリング間隔の120秒に収まるようにする
+HTTP_TIMEOUT_SEC = 6           # httpx の1操作あたり（接続は3秒）
+HTTP_FETCH_TIMEOUT_SEC = 15    # httpx 全体（接続3秒×2回（リトライ1回）＋読み込み6秒＋余裕）
+PAGE_GOTO_TIMEOUT_MS = 10_000  # Playwright の goto
+PAGE_READY_TIMEOUT_MS = 6_000  # Playwright のダーツ行の描画待ち
+SCRAPE_TIMEOUT_SEC = 25        # Playwright 全体（起動〜7秒＋goto 10秒＋Cookie 1秒＋描画待ち 6秒＋余裕）
+# 保存先（Koyeb で再起動をまたいで残すならボリュームのパスを DATA_DIR に指定）
+DATA_DIR   = os.getenv("DATA_DIR", ".")
+SUBS_FILE  = os.path.join(DATA_DIR, "subs.json")   # 通知ONユーザ保存
+STATE_FILE = os.path.join(DATA_DIR, "state.json")  # 直近の取得結果保存（last_status, last_checked_at, last_notified）
+os.makedirs(DATA_DIR, exist_ok=True)
+# 静的HTMLで読めないときに Playwright(Chromium) で描画して取得するか（"0" で無効）
+USE_PLAYWRIGHT = os.getenv("USE_PLAYWRIGHT", "1") != "0"
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+)
+# ポーリングする時間帯（JST, "10-5" で 10:00〜翌5:00）。空なら24時間
+OPEN_HOURS = os.getenv("OPEN_HOURS", "")
+# Chromium をこの秒数使わなければ終了してメモリを返す（次の取得で起動し直す）
+BROWSER_IDLE_SEC = 600
+# 別コンテナで動かしている Chromium の CDP エンドポイント（指定時はプロセス内で起動しない）
+CDP_URL = os.getenv("CDP_URL", "")
+# Chromium のプロファイル置き場（指定時のみ。ボリューム上なら再起動後もキャッシュが効く）
+BROWSER_PROFILE_DIR = os.getenv("BROWSER_PROFILE_DIR", "")
 
 # ===== ログ =====
 logging.basicConfig(
@@ -74,18 +125,47 @@ def read_bot_token() -> str:
 
 TOKEN = read_bot_token()
 
-# ===== JSON永続化 =====
+# ===== JSON永続化（orjson があれば使い、無ければ標準の json） =====
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _dumps(obj) -> bytes:
+    # ボットの保存用ファイルで人が編集するものではないので整形しない
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _loads(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 def _read_json(path: str, default):
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            return _loads(f.read())
     except Exception:
         return default
 
+# 最後に書き込んだ内容（path → JSONバイト列）。同じ内容なら書き込みを省く
+_LAST_WRITTEN: Dict[str, bytes] = {}
+# 書き込みはワーカースレッドからも呼ばれるので、同じ一時ファイルを取り合わないよう直列化する
+_WRITE_LOCK = threading.Lock()
+
 def _write_json(path: str, obj) -> None:
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(obj, f, ensure_ascii=False, indent=2)
+        payload = _dumps(obj)
+        with _WRITE_LOCK:
+            if _LAST_WRITTEN.get(path) == payload:
+                return
+            # 書き込み途中で落ちてもファイルが壊れないよう、一時ファイル → os.replace
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+            _LAST_WRITTEN[path] = payload
     except Exception as e:
         log.warning("write_json %s: %s", path, e)
 
@@ -93,128 +173,517 @@ def load_subs() -> Set[int]:
     data = _read_json(SUBS_FILE, [])
     return set(int(x) for x in data)
 
-def save_subs(s: Set[int]) -> None:
-    _write_json(SUBS_FILE, list(s))
+def save_subs(s: AbstractSet[int]) -> None:
+    _write_json(SUBS_FILE, sorted(s))
+
+# 連続したON/OFFを1回の書き込みにまとめる（SUBS_FLUSH_DELAY_SEC 後に保存）
+SUBS_FLUSH_DELAY_SEC = 2.0
+_SUBS_FLUSH: Optional[asyncio.TimerHandle] = None
+# スレッドで実行中の書き込み。古い内容が新しい内容の後に書かれないよう、終わるまで次を出さない
+_SUBS_WRITE: Optional[asyncio.Future] = None
+
+def mark_subs_dirty() -> None:
+    # SUBSCRIBERS を変更したら必ず呼ぶ（読み取り用スナップショットの更新＋保存の予約）
+    global _SUBS_FLUSH, SUBS_SNAPSHOT
+    SUBS_SNAPSHOT = frozenset(SUBSCRIBERS)
+    if _SUBS_FLUSH is None:
+        _SUBS_FLUSH = asyncio.get_running_loop().call_later(SUBS_FLUSH_DELAY_SEC, _flush_subs_later)
+
+def _flush_subs_later() -> None:
+    global _SUBS_FLUSH, _SUBS_WRITE
+    loop = asyncio.get_running_loop()
+    if _SUBS_WRITE is not None and not _SUBS_WRITE.done():
+        # 前回の書き込みがまだ終わっていなければ、予約を後ろにずらす
+        _SUBS_FLUSH = loop.call_later(SUBS_FLUSH_DELAY_SEC, _flush_subs_later)
+        return
+    _SUBS_FLUSH = None
+    # スナップショットは不変なのでそのままスレッドに渡せる
+    _SUBS_WRITE = loop.run_in_executor(None, save_subs, SUBS_SNAPSHOT)
+
+async def flush_subs() -> None:
+    # 終了時用：予約を取り消し、スレッドの書き込みが終わるのを待ってから同期で書く
+    global _SUBS_FLUSH
+    if _SUBS_FLUSH is not None:
+        _SUBS_FLUSH.cancel()
+        _SUBS_FLUSH = None
+    if _SUBS_WRITE is not None:
+        await _SUBS_WRITE
+    save_subs(SUBSCRIBERS)
 
 def load_state() -> Dict[str, str]:
-    # 例: {"last_status": "満席" or "残1席", "last_checked_at": "YYYY-MM-DD HH:MM:SS"}
+    # 例: {"last_status": "満席" or "残1席", "last_checked_at": "YYYY-MM-DD HH:MM:SS",
+    #      "last_notified": 最後に通知（または通知判定の基準に）した状態}
     return _read_json(STATE_FILE, {})
 
-def save_state(status: Optional[str]) -> None:
-    state = {
-        "last_status": status or "",
-        "last_checked_at": now_jp(),
+def _state_to_save() -> Dict[str, str]:
+    return {
+        "last_status": STATE.get("last_status") or "",
+        "last_checked_at": STATE.get("last_checked_at") or now_jp(),
+        "last_notified": STATE.get("last_notified") or "",
     }
-    _write_json(STATE_FILE, state)
+
+# 取得のたびに書かず、STATE_FLUSH_DELAY_SEC 以内の更新は1回の書き込みにまとめる
+STATE_FLUSH_DELAY_SEC = 2.0
+_STATE_FLUSH: Optional[asyncio.TimerHandle] = None
+# スレッドで実行中の書き込み（subs.json と同じく、終わるまで次を出さない）
+_STATE_WRITE: Optional[asyncio.Future] = None
+
+def mark_state_dirty() -> None:
+    # STATE を変更したら呼ぶ（保存の予約）
+    global _STATE_FLUSH
+    if _STATE_FLUSH is None:
+        _STATE_FLUSH = asyncio.get_running_loop().call_later(STATE_FLUSH_DELAY_SEC, _flush_state_later)
+
+def _flush_state_later() -> None:
+    global _STATE_FLUSH, _STATE_WRITE
+    loop = asyncio.get_running_loop()
+    if _STATE_WRITE is not None and not _STATE_WRITE.done():
+        _STATE_FLUSH = loop.call_later(STATE_FLUSH_DELAY_SEC, _flush_state_later)
+        return
+    _STATE_FLUSH = None
+    # 内容はループ上で確定させ、ファイル I/O だけスレッドで行う
+    _STATE_WRITE = loop.run_in_executor(None, _write_json, STATE_FILE, _state_to_save())
+
+async def flush_state() -> None:
+    # 終了時用：スレッドの書き込みが終わるのを待ち、保存待ちがあれば予約を取り消して同期で書く
+    global _STATE_FLUSH
+    if _STATE_WRITE is not None:
+        await _STATE_WRITE
+    if _STATE_FLUSH is None:
+        return
+    _STATE_FLUSH.cancel()
+    _STATE_FLUSH = None
+    _write_json(STATE_FILE, _state_to_save())
 
 SUBSCRIBERS: Set[int] = load_subs()
+# 読み取り用（is_on / 配信）の不変コピー。変更時だけ作り直すので配信のたびにコピーしない
+SUBS_SNAPSHOT: FrozenSet[int] = frozenset(SUBSCRIBERS)
 STATE: Dict[str, str] = load_state()  # 起動時に直近状態を復元（なくてもOK）
 
-# ===== Playwrightでの取得 =====
-from playwright.async_api import async_playwright
-
-_Z2H = str.maketrans("０１２３４５６７８９", "0123456789")
+# ===== 取得結果の解析 =====
+# 全角数字→半角、全角スペース/タブ→半角スペースを1回の translate で済ませる
+_Z2H = str.maketrans("０１２３４５６７８９\u3000\t", "0123456789  ")
+_PAT_SPACES = re.compile(r" {2,}")
+_PAT_STATUS = re.compile(r"(満席|残\s*\d+\s*席(?:以上)?)")
+_PAT_HTML_SKIP = re.compile(r"<(script|style|noscript)\b.*?</\1\s*>", re.S | re.I)
+_PAT_HTML_TAG = re.compile(r"<[^>]+>")
+DARTS_LOOKAHEAD_LINES = 2  # 「ダーツ」の行に状態が無いとき、下に何行まで見るか
+DARTS_EXCERPT_MAX = 400    # Playwright から受け取る1か所あたりの最大文字数
 
 def _norm_spaces(s: str) -> str:
     s = s.translate(_Z2H)
-    return re.sub(r"[\u3000\t ]+", " ", s)
-
-async def _scrape_once() -> Tuple[Optional[str], Optional[str]]:
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True, args=["--no-sandbox"])
-        ctx = await browser.new_context(
-            locale="ja-JP",
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+    if "  " not in s:
+        return s
+    return _PAT_SPACES.sub(" ", s)
+
+def _html_to_text(src: str) -> str:
+    # innerText の簡易版：script/style を捨て、タグを改行にして空行を詰める
+    s = _PAT_HTML_SKIP.sub(" ", src)
+    s = html.unescape(_PAT_HTML_TAG.sub("\n", s))
+    return "\n".join(ln.strip() for ln in s.splitlines() if ln.strip())
+
+def canon_status(s: str) -> str:
+    # 「残 3 席」「残3席」などページ上の空白の揺れで“変化あり”にならないよう空白を除く
+    return "".join(s.split())
+
+def _parse_html(src: str) -> Tuple[Optional[str], Optional[str]]:
+    return _parse_status(_html_to_text(src))
+
+def _line_end(t: str, pos: int) -> int:
+    # pos を含む行の終わり（改行の位置。最終行なら末尾）
+    end = t.find("\n", pos)
+    return len(t) if end < 0 else end
+
+def _parse_status(body_text: str) -> Tuple[Optional[str], Optional[str]]:
+    # 「ダーツ」が無ければ正規表現は走らせない（探すだけなら正規化は不要）
+    idx = body_text.find("ダーツ")
+    if idx < 0:
+        return None, _norm_spaces(body_text[:600])
+
+    # 「ダーツ」を含む行ごとに、その行と続く DARTS_LOOKAHEAD_LINES 行の範囲を集める
+    # rows[k] = [(行頭, 行末), 次の行, …]
+    rows = []
+    while idx >= 0:
+        spans = []
+        start = body_text.rfind("\n", 0, idx) + 1
+        for _ in range(DARTS_LOOKAHEAD_LINES + 1):
+            end = _line_end(body_text, start)
+            spans.append((start, end))
+            if end >= len(body_text):
+                break
+            start = end + 1
+        rows.append(spans)
+        idx = body_text.find("ダーツ", spans[0][1])
+
+    # 近い順に見る：まず全ての「ダーツ」行そのもの、次に全ての1行後、2行後…
+    # （メニュー等での言及より、状態と同じ行/すぐ下の行にある本物の行を優先する）
+    for depth in range(DARTS_LOOKAHEAD_LINES + 1):
+        for spans in rows:
+            if depth >= len(spans):
+                continue
+            ls, e = spans[depth]
+            m = _PAT_STATUS.search(_norm_spaces(body_text[ls:e]))
+            if m:
+                # 全角→半角・空白詰めはこの切り出しにだけかける
+                return canon_status(m.group(1)), _norm_spaces(body_text[spans[0][0]:e])[:200]
+
+    # 遠くまで探すと別の席種の表示を拾いかねないので、ここで諦める
+    return None, _norm_spaces(body_text[:600])
+
+# ===== httpxでの取得（静的HTML。接続はプロセス内で使い回す） =====
+HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+def _get_http_client() -> httpx.AsyncClient:
+    global HTTP_CLIENT
+    if HTTP_CLIENT is None:
+        HTTP_CLIENT = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT, "Accept-Language": "ja-JP,ja;q=0.9"},
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SEC, connect=3.0),
+            follow_redirects=True,
+            transport=httpx.AsyncHTTPTransport(
+                retries=1,
+                limits=httpx.Limits(
+                    max_keepalive_connections=4,
+                    max_connections=10,
+                    # 間隔が短いうち（120s・240s）とボタン操作の連続取得では TLS ハンドシェイクを省く
+                    # （変化が無く 480s 以上に延びた後や失敗バックオフ中は張り直しになる）
+                    keepalive_expiry=300,
+                ),
             ),
-            java_script_enabled=True,
         )
-        page = await ctx.new_page()
-        await page.goto(URL, wait_until="domcontentloaded", timeout=45_000)
+    return HTTP_CLIENT
 
-        # Cookieバナー等があれば閉じる（失敗は無視）
-        for sel in ["#onetrust-accept-btn-handler", ".btn-accept", "button.accept"]:
+async def close_http_client() -> None:
+    global HTTP_CLIENT
+    if HTTP_CLIENT is not None:
+        try:
+            await HTTP_CLIENT.aclose()
+        except Exception as e:
+            log.warning("close_http_client: %s", e)
+        HTTP_CLIENT = None
+
+# 前回 200 応答の検証子・本文ハッシュと解析結果。304 が返れば本文の受信も解析も省く
+_HTTP_ETAG: Optional[str] = None
+_HTTP_LAST_MODIFIED: Optional[str] = None
+_HTTP_BODY_HASH: Optional[bytes] = None
+_HTTP_RESULT: Optional[Tuple[Optional[str], Optional[str]]] = None
+
+_DARTS_UTF8 = "ダーツ".encode("utf-8")
+
+def _parse_http_body(r: httpx.Response) -> Tuple[Optional[str], Optional[str]]:
+    # UTF-8 と分かっていれば、デコード前のバイト列で「ダーツ」の有無だけ先に見る
+    # （JS で描画するページなら全体のデコードとタグ除去を丸ごと省ける）
+    if (r.charset_encoding or "").lower() in ("utf-8", "utf8") and _DARTS_UTF8 not in r.content:
+        return None, "static HTML has no ダーツ"
+    return _parse_html(r.text)
+
+async def _fetch_http() -> Tuple[Optional[str], Optional[str]]:
+    global _HTTP_ETAG, _HTTP_LAST_MODIFIED, _HTTP_BODY_HASH, _HTTP_RESULT
+    headers: Dict[str, str] = {}
+    if _HTTP_RESULT is not None:
+        if _HTTP_ETAG:
+            headers["If-None-Match"] = _HTTP_ETAG
+        if _HTTP_LAST_MODIFIED:
+            headers["If-Modified-Since"] = _HTTP_LAST_MODIFIED
+
+    r = await _get_http_client().get(URL, headers=headers)
+    if r.status_code == 304 and _HTTP_RESULT is not None:
+        return _HTTP_RESULT
+    r.raise_for_status()
+
+    # 検証子を返さないサーバでも、本文が前回と同じなら解析し直さない
+    body_hash = hashlib.blake2b(r.content, digest_size=16).digest()
+    if body_hash == _HTTP_BODY_HASH and _HTTP_RESULT is not None:
+        result = _HTTP_RESULT
+    else:
+        # HTML 全体のタグ除去は重めなので、イベントループを止めないよう別スレッドで
+        result = await asyncio.to_thread(_parse_http_body, r)
+
+    # 検証子・ハッシュ・結果は解析が済んでからまとめて更新する
+    # （途中で打ち切られたときに新しい ETag と古い結果が組にならないように）
+    _HTTP_ETAG = r.headers.get("ETag")
+    _HTTP_LAST_MODIFIED = r.headers.get("Last-Modified")
+    _HTTP_BODY_HASH = body_hash
+    _HTTP_RESULT = result
+    return result
+
+# ===== Playwrightでの取得（静的HTMLで読めないときのフォールバック） =====
+from playwright.async_api import async_playwright, Playwright, Browser, BrowserContext, Page
+from playwright.async_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+# Chromium/コンテキスト/ページはプロセス内で1つだけ作って使い回す
+# （取得は fetch_status の single-flight で直列になるので、ページを共有しても重ならない）
+_PW: Optional[Playwright] = None
+_BROWSER: Optional[Browser] = None
+_CTX: Optional[BrowserContext] = None
+_PAGE: Optional[Page] = None
+_BROWSER_LOCK = asyncio.Lock()
+
+# 小さいインスタンス向け：使わない機能を止め、V8 ヒープ上限も絞る
+CHROMIUM_ARGS = [
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-translate",
+    "--disable-features=Translate,MediaRouter,VizDisplayCompositor",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--mute-audio",
+    "--js-flags=--max-old-space-size=128",
+]
+
+# 空席テキストの取得に不要なリソース・計測タグは読み込まない
+_BLOCKED_RESOURCES = {"image", "stylesheet", "font", "media", "texttrack", "manifest"}
+_BLOCKED_HOSTS = ("google-analytics.com", "googletagmanager.com", "doubleclick.net")
+
+async def _block_heavy(route) -> None:
+    req = route.request
+    if req.resource_type in _BLOCKED_RESOURCES or any(h in req.url for h in _BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+# 「ダーツ」と空席表示（全角数字も可）がどちらも描画済みか
+_JS_DARTS_READY = r"""() => {
+    const t = document.body ? document.body.innerText : "";
+    return t.includes("ダーツ") && /(満席|残\s*[0-9０-９]+\s*席)/.test(t);
+}"""
+
+# innerText のうち「ダーツ」を含む行と続く n 行だけを（行単位で、最大 max 文字）切り出して返す
+# （見つからなければ解析ヒント用に先頭だけ）
+_JS_DARTS_EXCERPT = r"""([n, max]) => {
+    const t = document.body ? document.body.innerText : "";
+    let i = t.indexOf("ダーツ");
+    if (i < 0) return t.slice(0, 600);
+    const out = [];
+    while (i >= 0 && out.length < 20) {
+        const start = t.lastIndexOf("\n", i) + 1;
+        let end = i;
+        for (let k = 0; k <= n && end < t.length; k++) {
+            const e = t.indexOf("\n", end);
+            end = e < 0 ? t.length : e + 1;
+        }
+        out.push(t.slice(start, Math.min(end, start + max)).replace(/\n$/, ""));
+        const lineEnd = t.indexOf("\n", i);
+        i = lineEnd < 0 ? -1 : t.indexOf("ダーツ", lineEnd);
+    }
+    return out.join("\n");
+}"""
+
+async def _get_context() -> BrowserContext:
+    global _PW, _BROWSER, _CTX, _PAGE
+    async with _BROWSER_LOCK:
+        if _PW is None:
+            _PW = await async_playwright().start()
+        if _BROWSER is not None and not _BROWSER.is_connected():
+            # Chromium が落ちている（または CDP が切れている）なら作り直す
+            log.warning("browser disconnected, relaunching")
+            _BROWSER, _CTX, _PAGE = None, None, None
+        if _CTX is None:
+            opts = dict(locale="ja-JP", user_agent=USER_AGENT, java_script_enabled=True)
+            if CDP_URL:
+                # サイドカーの Chromium に接続する（落ちてもボット本体は巻き込まれない）
+                if _BROWSER is None:
+                    _BROWSER = await _PW.chromium.connect_over_cdp(CDP_URL)
+                ctx = await _BROWSER.new_context(**opts)
+            elif BROWSER_PROFILE_DIR:
+                # プロファイルをディスクに置き、HTTPキャッシュを再起動後も使う
+                ctx = await _PW.chromium.launch_persistent_context(
+                    BROWSER_PROFILE_DIR, headless=True, args=CHROMIUM_ARGS, **opts
+                )
+            else:
+                if _BROWSER is None:
+                    _BROWSER = await _PW.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+                ctx = await _BROWSER.new_context(**opts)
+            await ctx.route("**/*", _block_heavy)
+            _CTX = ctx
+        return _CTX
+
+async def _get_page() -> Page:
+    global _PAGE
+    ctx = await _get_context()
+    async with _BROWSER_LOCK:
+        if _PAGE is None or _PAGE.is_closed():
+            _PAGE = await ctx.new_page()
+        return _PAGE
+
+async def close_browser() -> None:
+    global _PW, _BROWSER, _CTX, _PAGE
+    async with _BROWSER_LOCK:
+        # 落ちた直後はどれかが失敗しやすいので、1つずつ閉じて残りを取りこぼさない
+        if _CTX is not None:
             try:
-                await page.locator(sel).click(timeout=1000)
-                break
-            except Exception:
-                pass
+                await _CTX.close()
+            except Exception as e:
+                log.warning("close_browser (context): %s", e)
+        if _BROWSER is not None:
+            try:
+                await _BROWSER.close()
+            except Exception as e:
+                log.warning("close_browser (browser): %s", e)
+        if _PW is not None:
+            try:
+                await _PW.stop()
+            except Exception as e:
+                log.warning("close_browser (playwright): %s", e)
+        _PW, _BROWSER, _CTX, _PAGE = None, None, None, None
 
-        await page.wait_for_timeout(1200)
+async def _scrape_page(page: Page) -> Tuple[Optional[str], Optional[str]]:
+    # ページは閉じずに次回も同じものを goto し直す
+    await page.goto(URL, wait_until="domcontentloaded", timeout=PAGE_GOTO_TIMEOUT_MS)
 
-        body_text = await page.evaluate("document.body.innerText")
-        await browser.close()
+    # Cookieバナー等があれば閉じる（失敗は無視）。候補はまとめて1回だけ待つ
+    try:
+        await page.locator("#onetrust-accept-btn-handler, .btn-accept, button.accept").first.click(timeout=1000)
+    except Exception:
+        pass
 
-    t = _norm_spaces(body_text)
-    pat = re.compile(r"(満席|残\s*\d+\s*席(?:以上)?)")
-    lines = t.splitlines()
+    # 固定で待たず「ダーツ」と空席表示が揃ったら進む（出なければそのまま本文を読む）
+    try:
+        await page.wait_for_function(_JS_DARTS_READY, timeout=PAGE_READY_TIMEOUT_MS)
+    except PlaywrightTimeoutError:
+        pass
 
-    for i, ln in enumerate(lines):
-        if "ダーツ" in ln:
-            m = pat.search(ln)
-            if m:
-                return m.group(1), _norm_spaces(ln)[:200]
-            ctx = " ".join(lines[i:i+3])
-            m = pat.search(ctx)
-            if m:
-                return m.group(1), _norm_spaces(ctx)[:200]
+    # 本文全体ではなく「ダーツ」周辺だけを受け取る（CDP 経由の転送量を減らす）
+    body_text = await page.evaluate(_JS_DARTS_EXCERPT, [DARTS_LOOKAHEAD_LINES, DARTS_EXCERPT_MAX])
+    return _parse_status(body_text)
 
-    m = re.search(r"ダーツ.*?(満席|残\s*\d+\s*席(?:以上)?)", t, re.S)
-    if m:
-        return m.group(1), _norm_spaces(t)[:300]
+# 最後に Chromium で取得した時刻（monotonic）。アイドル判定に使う
+_LAST_SCRAPE_AT = 0.0
 
-    return None, _norm_spaces(t)[:600]
+async def close_idle_browser(ctx: ContextTypes.DEFAULT_TYPE) -> None:
+    # httpx で読めている間や通知先が居ない間は Chromium を抱えたままにしない
+    if _PW is None or fetch_in_progress():
+        return
+    if time.monotonic() - _LAST_SCRAPE_AT < BROWSER_IDLE_SEC:
+        return
+    log.info("browser idle for %ss, closing", BROWSER_IDLE_SEC)
+    await close_browser()
 
-async def fetch_status() -> Tuple[Optional[str], Optional[str]]:
-    """
-    成功: (status文字列, デバッグ用スニペット)
-    失敗: (None, 解析ヒント)
-    """
+async def _discard_page() -> None:
+    global _PAGE
+    page, _PAGE = _PAGE, None
+    if page is not None:
+        try:
+            await page.close()
+        except Exception as e:
+            log.warning("discard page: %s", e)
+
+async def _scrape_once() -> Tuple[Optional[str], Optional[str]]:
+    global _LAST_SCRAPE_AT
+    _LAST_SCRAPE_AT = time.monotonic()
+    try:
+        return await _scrape_page(await _get_page())
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        # 途中で打ち切られたらナビゲーション中のページは捨て、次の取得は新しいページで始める
+        await _discard_page()
+        raise
+    except PlaywrightTimeoutError:
+        # 読み込みが遅いだけならブラウザはそのまま使う
+        raise
+    except PlaywrightError as e:
+        # Chromium が落ちた・切断された等。捨てて次回の取得で起動し直す
+        log.warning("playwright error, relaunch browser on next fetch: %s", e)
+        await close_browser()
+        raise
+
+async def _fetch_once() -> Tuple[Optional[str], Optional[str]]:
+    # まず軽い HTTP GET で試し、読めなければ Chromium で描画して取得
+    try:
+        status, snippet = await asyncio.wait_for(_fetch_http(), timeout=HTTP_FETCH_TIMEOUT_SEC)
+    except Exception as e:
+        if not USE_PLAYWRIGHT:
+            raise
+        log.info("http fetch failed, fallback to playwright: %s", e)
+        status, snippet = None, None
+    if status or not USE_PLAYWRIGHT:
+        return status, snippet
+    return await asyncio.wait_for(_scrape_once(), timeout=SCRAPE_TIMEOUT_SEC)
+
+async def _fetch_status_uncached() -> Tuple[Optional[str], Optional[str]]:
     try:
         # 1回目
-        return await asyncio.wait_for(_scrape_once(), timeout=50)
+        return await _fetch_once()
     except Exception as e1:
         # 2回目（軽めのリトライ）
         log.warning("fetch retry: %s", e1)
         try:
             await asyncio.sleep(1.2)
-            return await asyncio.wait_for(_scrape_once(), timeout=50)
+            return await _fetch_once()
         except Exception as e2:
-            err = f"error: {e2}\n{traceback.format_exc(limit=2)}"
-            return None, err
+            # トレースバックはログにだけ出す（呼び出し元には短い理由のみ返す）
+            log.exception("fetch failed")
+            return None, f"error: {type(e2).__name__}"
+
+# 直近の成功結果（monotonic時刻, 取得時刻の表示用文字列, 結果）。ポーリングと手動取得で共有する
+_FETCH_CACHE: Optional[Tuple[float, str, Tuple[Optional[str], Optional[str]]]] = None
+# 実行中の取得。重なった呼び出しは同じ結果を待つ（Chromium を並行で動かさない）
+_IN_FLIGHT: Optional[asyncio.Task] = None
+
+def _finish_fetch(task: asyncio.Task) -> None:
+    global _FETCH_CACHE, _IN_FLIGHT
+    _IN_FLIGHT = None
+    if task.cancelled() or task.exception() is not None:
+        return
+    result = task.result()
+    if result[0]:
+        _FETCH_CACHE = (time.monotonic(), now_jp(), result)
+
+def fetch_in_progress() -> bool:
+    return _IN_FLIGHT is not None
+
+def last_fetched_at() -> str:
+    # キャッシュを返したときも「実際に取得した時刻」を表示する
+    return _FETCH_CACHE[1] if _FETCH_CACHE else now_jp()
+
+async def fetch_status(max_age: float = CACHE_TTL_SEC) -> Tuple[Optional[str], Optional[str]]:
+    """
+    成功: (status文字列, デバッグ用スニペット)
+    失敗: (None, 解析ヒント)
+    max_age 秒以内に成功した結果があれば取得せずにそれを返す
+    """
+    global _IN_FLIGHT
+    if _FETCH_CACHE and time.monotonic() - _FETCH_CACHE[0] < max_age:
+        return _FETCH_CACHE[2]
+    if _IN_FLIGHT is None:
+        _IN_FLIGHT = asyncio.create_task(_fetch_status_uncached())
+        _IN_FLIGHT.add_done_callback(_finish_fetch)
+    # 呼び出し元がキャンセルされても、待っている他の呼び出しのために取得は続ける
+    return await asyncio.shield(_IN_FLIGHT)
 
 # ===== UI（テキスト＆ボタン） =====
 def is_on(chat_id: int) -> bool:
-    return chat_id in SUBSCRIBERS
+    return chat_id in SUBS_SNAPSHOT
 
 def current_status_text() -> str:
     last = STATE.get("last_status") or "—"
     ts   = STATE.get("last_checked_at") or now_jp()
     return f"現在のダーツ: {last}（{ts}）"
 
-def menu_text(chat_id: int) -> str:
-    on = is_on(chat_id)
-    on_line = "現在: 🟢 通知ON" if on else "現在: 🔴 通知OFF"
-    return (
+# メニュー上部（ON/OFF の行まで）は2通りしかないので先に組み立てておく
+_MENU_HEAD = {
+    on: (
         "快活クラブ『ダーツ』空席ウォッチ。\n"
         "下のボタンで通知ON/OFFの切替や、今すぐ取得ができます。\n"
-        f"{on_line}\n"
-        f"{current_status_text()}"
+        f"{'現在: 🟢 通知ON' if on else '現在: 🔴 通知OFF'}\n"
     )
+    for on in (True, False)
+}
+
+def menu_text(chat_id: int) -> str:
+    return _MENU_HEAD[is_on(chat_id)] + current_status_text()
+
+# 取得中表示も ON/OFF の2通りだけなので組み立て済みのものを返す
+_SPINNER = {on: _MENU_HEAD[on] + "⏳ 取得中…" for on in (True, False)}
 
 def spinner_text(chat_id: int) -> str:
-    on = is_on(chat_id)
-    on_line = "現在: 🟢 通知ON" if on else "現在: 🔴 通知OFF"
-    return (
-        "快活クラブ『ダーツ』空席ウォッチ。\n"
-        "下のボタンで通知ON/OFFの切替や、今すぐ取得ができます。\n"
-        f"{on_line}\n"
-        "⏳ 取得中…"
-    )
+    return _SPINNER[is_on(chat_id)]
 
-def build_keyboard(chat_id: int) -> InlineKeyboardMarkup:
-    on = is_on(chat_id)
+def _make_keyboard(on: bool) -> InlineKeyboardMarkup:
     # ボタンは「次の操作」を表示：ON中は「通知OFF」、OFF中は「通知ON」
     toggle_label = "⛔ 通知OFF" if on else "🟢 通知ON"
     kb = [
@@ -223,7 +692,38 @@ def build_keyboard(chat_id: int) -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(kb)
 
+# キーボードも ON/OFF の2通りだけ。PTB のオブジェクトは不変なので使い回せる
+_KEYBOARDS = {True: _make_keyboard(True), False: _make_keyboard(False)}
+
+def build_keyboard(chat_id: int) -> InlineKeyboardMarkup:
+    return _KEYBOARDS[is_on(chat_id)]
+
+async def edit_menu(message, text: str, chat_id: int) -> None:
+    # 連打などで内容が同じだと Telegram は "message is not modified" を返すので、それは無視する
+    try:
+        await message.edit_text(
+            text=text,
+            reply_markup=build_keyboard(chat_id),
+            disable_web_page_preview=True,
+        )
+    except BadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            raise
+
 # ===== ハンドラ =====
+# 再接続時などに同じ update が再配送されても二重に処理しない
+_SEEN_UPDATES: "OrderedDict[int, None]" = OrderedDict()
+SEEN_UPDATES_MAX = 1000
+
+async def dedup_updates(u: Update, c: ContextTypes.DEFAULT_TYPE) -> None:
+    uid = u.update_id
+    if uid in _SEEN_UPDATES:
+        log.info("duplicate update skipped: %s", uid)
+        raise ApplicationHandlerStop
+    _SEEN_UPDATES[uid] = None
+    if len(_SEEN_UPDATES) > SEEN_UPDATES_MAX:
+        _SEEN_UPDATES.popitem(last=False)
+
 async def show_menu(u: Update, c: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = u.effective_chat.id
     await u.effective_message.reply_text(
@@ -235,6 +735,18 @@ async def show_menu(u: Update, c: ContextTypes.DEFAULT_TYPE) -> None:
 async def cmd_start(u: Update, c: ContextTypes.DEFAULT_TYPE) -> None:
     await show_menu(u, c)
 
+# ボタン操作からの取得は、ポーリング間隔の半分以内の結果なら使い回す（表示には取得時刻が出る）
+UI_MAX_AGE_SEC = CHECK_INTERVAL_SEC / 2
+
+async def refresh_state() -> Optional[str]:
+    status, _ = await fetch_status(max_age=UI_MAX_AGE_SEC)
+    if status:
+        STATE["last_status"] = status
+        STATE["last_checked_at"] = last_fetched_at()
+        adopt_baseline_if_gated(status)
+        mark_state_dirty()
+    return status
+
 async def on_toggle(cbq, c: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = cbq.message.chat_id
     turned_on = None
@@ -242,71 +754,53 @@ async def on_toggle(cbq, c: ContextTypes.DEFAULT_TYPE) -> None:
     if is_on(chat_id):
         # OFFにする（取得はしない）
         SUBSCRIBERS.discard(chat_id)
-        save_subs(SUBSCRIBERS)
+        mark_subs_dirty()
         turned_on = False
-        await cbq.message.edit_text(
-            text=menu_text(chat_id),
-            reply_markup=build_keyboard(chat_id),
-            disable_web_page_preview=True,
-        )
+        await edit_menu(cbq.message, menu_text(chat_id), chat_id)
     else:
         # ONにする（即取得して反映）
         SUBSCRIBERS.add(chat_id)
-        save_subs(SUBSCRIBERS)
+        mark_subs_dirty()
         turned_on = True
 
         # スピナー表示 → 取得 → 反映
-        await cbq.message.edit_text(
-            text=spinner_text(chat_id),
-            reply_markup=build_keyboard(chat_id),
-            disable_web_page_preview=True,
-        )
-        status, _ = await fetch_status()
-        if status:
-            STATE["last_status"] = status
-            STATE["last_checked_at"] = now_jp()
-            save_state(status)
-
-        await cbq.message.edit_text(
-            text=menu_text(chat_id),
-            reply_markup=build_keyboard(chat_id),
-            disable_web_page_preview=True,
-        )
+        await edit_menu(cbq.message, spinner_text(chat_id), chat_id)
+        await refresh_state()
+
+        await edit_menu(cbq.message, menu_text(chat_id), chat_id)
 
     await cbq.answer("通知をONにしました" if turned_on else "通知をOFFにしました")
 
 async def on_refresh(cbq, c: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = cbq.message.chat_id
+    # 取得が走っている最中なら先に応答だけ返し、結果はその取得に相乗りして反映する
+    busy = fetch_in_progress()
+    if busy:
+        await cbq.answer("すでに取得中です。まもなく反映します", cache_time=5)
     # スピナー表示
-    await cbq.message.edit_text(
-        text=spinner_text(chat_id),
-        reply_markup=build_keyboard(chat_id),
-        disable_web_page_preview=True,
-    )
+    await edit_menu(cbq.message, spinner_text(chat_id), chat_id)
     # 取得→反映
-    status, _ = await fetch_status()
-    if status:
-        STATE["last_status"] = status
-        STATE["last_checked_at"] = now_jp()
-        save_state(status)
+    await refresh_state()
 
-    await cbq.message.edit_text(
-        text=menu_text(chat_id),
-        reply_markup=build_keyboard(chat_id),
-        disable_web_page_preview=True,
-    )
-    await cbq.answer("更新しました")
+    await edit_menu(cbq.message, menu_text(chat_id), chat_id)
+    if not busy:
+        # 連打はクライアント側で吸収させる
+        await cbq.answer("更新しました", cache_time=5)
+
+# callback_data → 処理
+CALLBACKS = {
+    "toggle": on_toggle,
+    "refresh": on_refresh,
+}
 
 async def cbq_handler(u: Update, c: ContextTypes.DEFAULT_TYPE) -> None:
     cbq = u.callback_query
-    data = cbq.data or ""
+    handler = CALLBACKS.get(cbq.data or "")
     try:
-        if data == "toggle":
-            await on_toggle(cbq, c)
-        elif data == "refresh":
-            await on_refresh(cbq, c)
-        else:
+        if handler is None:
             await cbq.answer("未対応の操作です", show_alert=False)
+        else:
+            await handler(cbq, c)
     except Exception as e:
         log.exception("callback error: %s", e)
         try:
@@ -315,31 +809,163 @@ async def cbq_handler(u: Update, c: ContextTypes.DEFAULT_TYPE) -> None:
             pass
 
 # ===== 定期ジョブ：変化時に新規メッセージで通知 =====
-LAST_STATUS_MEM: Optional[str] = STATE.get("last_status") or None
+# 通知判定の基準。再起動直後に「変化あり」と誤通知しないよう保存値から復元する
+# （last_notified の無い古い state.json は last_status で代用）
+_saved = STATE.get("last_notified") or STATE.get("last_status")
+LAST_STATUS_MEM: Optional[str] = canon_status(_saved) if _saved else None
+BROADCAST_CONCURRENCY = 8  # 同時送信数（Telegram の 30通/秒 制限に収まる程度）
+
+async def broadcast(bot, text: str) -> None:
+    sem = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    gone: Set[int] = set()  # ブロック/削除などで二度と届かないチャット
+
+    async def _send(chat_id: int, retry: bool = True) -> None:
+        throttled = False
+        async with sem:
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, disable_web_page_preview=True)
+            except RetryAfter as e:
+                # 429 のときは指定秒数だけ枠を握ったまま待ち、後続の送信を遅らせる
+                log.warning("send throttled %s: retry after %ss", chat_id, e.retry_after)
+                await asyncio.sleep(e.retry_after)
+                throttled = True
+            except Forbidden as e:
+                log.info("send forbidden %s: %s", chat_id, e)
+                gone.add(chat_id)
+            except BadRequest as e:
+                msg = str(e).lower()
+                if "chat not found" in msg or "user is deactivated" in msg:
+                    log.info("send chat gone %s: %s", chat_id, e)
+                    gone.add(chat_id)
+                else:
+                    log.warning("send failed %s: %s", chat_id, e)
+            except Exception as e:
+                # 失敗しても他ユーザは続行
+                log.warning("send failed %s: %s", chat_id, e)
+        # 429 で待った分は枠を返してから1回だけ送り直す（通知が黙って落ちないように）
+        if throttled and retry:
+            await _send(chat_id, retry=False)
+
+    await asyncio.gather(*(_send(chat_id) for chat_id in SUBS_SNAPSHOT))
+
+    if gone:
+        SUBSCRIBERS.difference_update(gone)
+        mark_subs_dirty()
+        log.info("unsubscribed %d unreachable chat(s)", len(gone))
+
+# ポーリングを止めていた間（通知先なし・時間外）は通知判定の基準が古いままになっている
+# （起動直後に通知先が居なければ、保存済みの基準もいつのものか分からない）
+_POLL_GATED = not SUBS_SNAPSHOT
+
+def adopt_baseline_if_gated(status: str) -> None:
+    # 止めていた間にボタン操作で取得した状態は、そのユーザがもう見ているので基準にする
+    # （再開後の最初のポーリングで同じ内容を【更新】として送らないように）
+    global LAST_STATUS_MEM, _POLL_GATED
+    if not _POLL_GATED:
+        return
+    _POLL_GATED = False
+    LAST_STATUS_MEM = status
+    STATE["last_notified"] = status
 
-async def poll_job(ctx: ContextTypes.DEFAULT_TYPE) -> None:
-    global LAST_STATUS_MEM
+# 直前の配信タスク。次の配信はこれの完了を待ってから始め、古い状態が後から届かないようにする
+_BROADCAST_TASK: Optional[asyncio.Task] = None
+
+async def _broadcast_after(prev: Optional[asyncio.Task], bot, text: str) -> None:
+    if prev is not None and not prev.done():
+        try:
+            await prev
+        except Exception:
+            pass  # 失敗は broadcast 側（PTB のタスク管理）でログ済み
+    await broadcast(bot, text)
+
+# 状態が変わらなかった連続回数。ポーリング間隔を延ばすのに使う
+_STABLE_COUNT = 0
+# 取得に失敗した連続回数（サイト障害中に叩き続けない）
+_FAIL_COUNT = 0
+
+def next_poll_delay() -> float:
+    if _FAIL_COUNT:
+        # 240s → 480s → … → 3600s（上限）。再開が揃わないよう少し揺らす
+        delay = min(CHECK_INTERVAL_SEC * (2 ** min(_FAIL_COUNT, 5)), POLL_FAIL_MAX_SEC)
+        return delay + random.uniform(0, CHECK_INTERVAL_SEC * 0.1)
+    # 120s → 240s → 480s → 600s（上限）。変化があれば 120s に戻る
+    return min(CHECK_INTERVAL_SEC * (2 ** min(_STABLE_COUNT, 3)), POLL_MAX_INTERVAL_SEC)
+
+def _parse_open_hours(spec: str) -> Optional[Tuple[int, int]]:
+    if not spec:
+        return None
+    try:
+        start, end = (int(x) % 24 for x in spec.split("-", 1))
+    except ValueError:
+        log.warning("OPEN_HOURS を解釈できないので無視します: %r", spec)
+        return None
+    return start, end
+
+_OPEN_HOURS = _parse_open_hours(OPEN_HOURS)
+
+def in_open_hours() -> bool:
+    if _OPEN_HOURS is None:
+        return True
+    start, end = _OPEN_HOURS
+    h = datetime.now(TZ).hour
+    # 日をまたぐ指定（例 10-5）にも対応
+    return start <= h < end if start < end else (h >= start or h < end)
+
+async def _poll_once(ctx: ContextTypes.DEFAULT_TYPE) -> None:
+    global LAST_STATUS_MEM, _STABLE_COUNT, _FAIL_COUNT, _BROADCAST_TASK, _POLL_GATED
+    # 通知先が居ない・営業時間外なら取得自体をしない
+    if not SUBS_SNAPSHOT or not in_open_hours():
+        _POLL_GATED = True
+        return
     status, _ = await fetch_status()
     if not status:
-        log.info("poll: fetched=None")
+        _FAIL_COUNT += 1
+        log.info("poll: fetched=None (%d in a row)", _FAIL_COUNT)
         return
+    _FAIL_COUNT = 0
+    _POLL_GATED = False
 
-    if status != LAST_STATUS_MEM:
-        LAST_STATUS_MEM = status
-        STATE["last_status"] = status
-        STATE["last_checked_at"] = now_jp()
-        save_state(status)
-        text = f"【更新】王子店ダーツ: {status}（{STATE['last_checked_at']}）\n{URL}"
-        # 失敗しても他ユーザは続行
-        for chat_id in list(SUBSCRIBERS):
-            try:
-                await ctx.bot.send_message(chat_id=chat_id, text=text, disable_web_page_preview=True)
-            except Exception as e:
-                log.warning("send failed %s: %s", chat_id, e)
+    if status == LAST_STATUS_MEM:
+        _STABLE_COUNT += 1
+        return
+
+    _STABLE_COUNT = 0
+    LAST_STATUS_MEM = status
+    STATE["last_status"] = status
+    STATE["last_checked_at"] = last_fetched_at()
+    STATE["last_notified"] = status
+    mark_state_dirty()
+    text = f"【更新】王子店ダーツ: {status}（{STATE['last_checked_at']}）\n{URL}"
+    # 配信は別タスクで流し、429 待ちなどで次回ポーリングの予約が遅れないようにする
+    # （前回の配信が残っていればその後ろにつなぐ）
+    _BROADCAST_TASK = ctx.application.create_task(_broadcast_after(_BROADCAST_TASK, ctx.bot, text))
+
+async def poll_job(ctx: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        await _poll_once(ctx)
+    finally:
+        # 次回は自分で予約する（失敗しても止まらないよう finally で）
+        ctx.job_queue.run_once(poll_job, when=next_poll_delay())
 
 # ===== アプリ構築 =====
+async def on_shutdown(app: Application) -> None:
+    await flush_subs()
+    await flush_state()
+    await close_http_client()
+    await close_browser()
+
 def build_app() -> Application:
-    app = ApplicationBuilder().token(TOKEN).build()
+    # 送信は PTB のレートリミッタ経由（全体 30通/秒・グループ 20通/分を超えないよう待たせる）
+    app = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .rate_limiter(AIORateLimiter())
+        .post_shutdown(on_shutdown)
+        .build()
+    )
+
+    # 重複除外は他のハンドラより先に評価する
+    app.add_handler(TypeHandler(Update, dedup_updates), group=-1)
 
     app.add_handler(CommandHandler("start", cmd_start))
     # 日本語トリガーでも同じメニューを出す
@@ -347,13 +973,28 @@ def build_app() -> Application:
 
     app.add_handler(CallbackQueryHandler(cbq_handler))
 
-    # ジョブ（2分ごと）
-    app.job_queue.run_repeating(poll_job, interval=CHECK_INTERVAL_SEC, first=10)
+    # ジョブ（初回は10秒後。以降は poll_job が次回を予約する）。使われていない Chromium は定期的に片付ける
+    app.job_queue.run_once(poll_job, when=10)
+    if USE_PLAYWRIGHT:
+        app.job_queue.run_repeating(close_idle_browser, interval=BROWSER_IDLE_SEC / 2, first=BROWSER_IDLE_SEC)
     return app
 
 def main() -> None:
+    # uvloop があればイベントループを差し替える（無ければ標準の asyncio のまま）
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     app = build_app()
-    app.run_polling(drop_pending_updates=True)
+    # getUpdates は長めの long polling（30秒）にして、アイドル時の空リクエストを減らす
+    # 受け取るのはハンドラで扱う message / callback_query だけ
+    app.run_polling(
+        drop_pending_updates=True,
+        poll_interval=0.0,
+        timeout=30,
+        allowed_updates=[Update.MESSAGE, Update.CALLBACK_QUERY],
+    )
 
 if __name__ == "__main__":
     main()
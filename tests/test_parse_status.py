@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("httpx")
+pytest.importorskip("playwright")
+
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp())
+
+import bot  # noqa: E402
+
+
+def test_status_on_darts_line():
+    assert bot._parse_status("メニュー\nビリヤード 満席\nダーツ　残　３　席\nカラオケ")[0] == "残3席"
+
+
+def test_status_on_next_line():
+    assert bot._parse_status("ダーツ\n残 1 席以上")[0] == "残1席以上"
+
+
+def test_menu_mention_does_not_pick_other_row():
+    # 先頭の設備一覧の「ダーツ」から他の席種の状態を拾わない
+    text = "設備: ダーツ / ビリヤード / カラオケ\nフロア案内\nオープン席 満席\nブース席 残5席\nダーツ 残2席"
+    assert bot._parse_status(text)[0] == "残2席"
+
+
+def test_menu_mention_html():
+    src = (
+        "<nav><a>ダーツ</a><a>ビリヤード</a></nav>"
+        "<table><tr><th>オープン席</th><td>満席</td></tr>"
+        "<tr><th>ダーツ</th><td>残2席</td></tr></table>"
+    )
+    assert bot._parse_html(src)[0] == "残2席"
+
+
+def test_no_status():
+    assert bot._parse_status("ダーツ\n準備中")[0] is None